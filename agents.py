@@ -24,12 +24,40 @@ from langchain_google_genai import ChatGoogleGenerativeAI, GoogleGenerativeAIEmb
 from langchain.text_splitter import RecursiveCharacterTextSplitter
 
 # --- Local Utils ---
+from results import FieldStatus, NOT_FOUND_VALUE, EXTRACTION_ERROR_VALUE, RATE_LIMIT_ERROR_VALUE
 # import pdf_utils # Not needed directly if text is passed in
 
 # --- Environment Loading ---
 from dotenv import load_dotenv
 load_dotenv()
 
+# --- Target Fields: name, retrieval query and extraction instructions ---
+TARGET_FIELDS = [
+    {"name": "Agreement Value",
+     "query": "What is the primary monetary value of the agreement, such as monthly rent, total rent, or security deposit amount?",
+     "format": "Extract ONLY the monetary value mentioned (e.g., '1500/month', 'Rupees 18,000', 'Rs.2000', '50000 rupees'). If multiple values exist (like rent and deposit), prioritize rent. If no value is found, return 'Not Found'."},
+    {"name": "Agreement Start Date",
+     "query": "What is the commencement date, start date, or effective date of this agreement?",
+     "format": "Extract ONLY the date. Return the date in YYYY-MM-DD format if possible, otherwise return the date as written. If no date is found, return 'Not Found'."},
+    {"name": "Agreement End Date",
+     "query": "What is the termination date, end date, or expiration date of this agreement term?",
+     "format": "Extract ONLY the date. Return the date in YYYY-MM-DD format if possible, otherwise return the date as written. If no date is found, return 'Not Found'."},
+    {"name": "Renewal Notice (Days)",
+     "query": "How many days notice is required before the end date for renewal or non-renewal termination? Look for phrases like 'notice period', 'days prior', 'written notice'.",
+     "format": "Extract ONLY the number of days (e.g., 30, 60, 90). Ignore other details. If no specific number of days is mentioned, return 'Not Found'."},
+    {"name": "Party One",
+     "query": "Identify the full name of the Tenant(s), Lessee(s), Resident(s), or the primary party agreeing to rent (often listed first or defined as such).",
+     "format": "Extract ONLY the full name(s) of the tenant/lessee/first party. If multiple tenants, list them separated by 'and' or commas as written. If not clearly identified, return 'Not Found'."},
+    {"name": "Party Two",
+     "query": "Identify the full name of the Landlord, Lessor, Owner, Property Manager, or the second party providing the rental property.",
+     "format": "Extract ONLY the full name(s) or company name of the landlord/lessor/second party. If not clearly identified, return 'Not Found'."}
+]
+
+def _field_query(field_info):
+    """The retrieval/QA query for a target field, including its formatting instruction."""
+    return f"{field_info['query']} Instruction: {field_info['format']}"
+
+
 class RentalAgreementAgent:
     def __init__(self, api_key):
         if not api_key:
@@ -40,6 +68,9 @@ class RentalAgreementAgent:
         self.vector_store = None
         self.retriever = None
         self.extracted_text = None # Agent can optionally store the text it processed
+        self.pages_processed = None # Pages indexed so far (set by progressive extraction)
+        self.field_statuses = {} # FieldStatus per field of the last extraction
+        self.field_sources = {} # Retrieved chunk texts each field was answered from
 
         try:
             self.llm = ChatGoogleGenerativeAI(
@@ -64,8 +95,9 @@ class RentalAgreementAgent:
     
 
 
-    def _create_vector_store(self, text):
-        """Chunks text, creates embeddings, builds FAISS index. Returns FAISS store."""
+    def _create_vector_store(self, text, template_index_path=None):
+        """Chunks text, creates embeddings, builds FAISS index. Returns FAISS store.
+        With template_index_path, chunks identical to the template's reuse its embeddings."""
         # --- (Keep implementation from Phase 3) ---
         if not text: print("Error: No text provided."); return None
         if not self.embeddings: print("Error: Embeddings not initialized."); return None
@@ -75,8 +107,18 @@ class RentalAgreementAgent:
             chunks = text_splitter.split_text(text)
             if not chunks: print("Warning: No chunks created."); return None
             print(f"Split text into {len(chunks)} chunks.")
-            print("Creating FAISS index...")
-            vector_store = FAISS.from_texts(chunks, self.embeddings)
+            template_embeddings = self._load_chunk_embeddings(template_index_path) if template_index_path else {}
+            if template_embeddings:
+                # Only embed the spans that differ from the template
+                new_chunks = list(dict.fromkeys(c for c in chunks if c not in template_embeddings))
+                print(f"Reusing template embeddings for {len(chunks) - len(new_chunks)} chunks, embedding {len(new_chunks)}.")
+                if new_chunks:
+                    template_embeddings.update(zip(new_chunks, self.embeddings.embed_documents(new_chunks)))
+                print("Creating FAISS index...")
+                vector_store = FAISS.from_embeddings([(c, template_embeddings[c]) for c in chunks], self.embeddings)
+            else:
+                print("Creating FAISS index...")
+                vector_store = FAISS.from_texts(chunks, self.embeddings)
             print("FAISS index created successfully.")
             return vector_store
         except Exception as e:
@@ -84,13 +126,25 @@ class RentalAgreementAgent:
             return None
 
 
-    def load_and_index_document(self, extracted_text):
-        """Loads text, creates index, sets up retriever. Returns bool."""
+    def _load_chunk_embeddings(self, index_path):
+        """Loads a saved FAISS index and returns {chunk_text: embedding}. Empty dict on failure."""
+        try:
+            stored = FAISS.load_local(index_path, self.embeddings, allow_dangerous_deserialization=True) # Written by this app
+            return {stored.docstore.search(doc_id).page_content: stored.index.reconstruct(i).tolist()
+                    for i, doc_id in stored.index_to_docstore_id.items()}
+        except Exception as e:
+            print(f"Warning: Could not load template embeddings from '{index_path}' ({type(e).__name__}): {e}")
+            return {}
+
+
+    def load_and_index_document(self, extracted_text, template_index_path=None):
+        """Loads text, creates index, sets up retriever. Returns bool.
+        template_index_path: saved index of a near-duplicate document whose chunk embeddings can be reused."""
          # --- (Keep implementation from Phase 3) ---
         print("Agent received request to load and index document...")
         if not extracted_text: print("Error: No text provided."); return False
         self.extracted_text = extracted_text
-        self.vector_store = self._create_vector_store(self.extracted_text)
+        self.vector_store = self._create_vector_store(self.extracted_text, template_index_path)
         if self.vector_store:
             self.retriever = self.vector_store.as_retriever(search_kwargs={"k": 5}) # Get top 5 chunks
             print("Retriever is ready.")
@@ -99,36 +153,60 @@ class RentalAgreementAgent:
             print("Indexing failed."); self.retriever = None; return False
 
 
+    def load_saved_index(self, extracted_text, index_path):
+        """Loads a previously saved FAISS index (exact duplicate document). Returns bool."""
+        print(f"Agent loading saved index from '{index_path}'...")
+        try:
+            self.vector_store = FAISS.load_local(index_path, self.embeddings, allow_dangerous_deserialization=True) # Written by this app
+        except Exception as e:
+            print(f"Error loading saved index ({type(e).__name__}): {e}")
+            self.vector_store = None; self.retriever = None; return False
+        self.extracted_text = extracted_text
+        self.retriever = self.vector_store.as_retriever(search_kwargs={"k": 5})
+        print("Retriever is ready.")
+        return True
+
+
+    def save_index(self, index_path):
+        """Saves the current FAISS index to index_path."""
+        if not self.vector_store:
+            raise ValueError("No index to save.")
+        self.vector_store.save_local(index_path)
+
+
+    def add_text_to_index(self, additional_text):
+        """Chunks and embeds additional text into the existing index. Returns bool."""
+        print("Agent received request to extend the index...")
+        if not additional_text: print("Warning: No additional text provided."); return False
+        if not self.vector_store: print("Error: No index to extend."); return False
+        try:
+            text_splitter = RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=200)
+            chunks = text_splitter.split_text(additional_text)
+            if not chunks: print("Warning: No chunks created."); return False
+            self.vector_store.add_texts(chunks) # Retriever shares this store, no rebuild needed
+            self.extracted_text = f"{self.extracted_text}\n\n{additional_text}" if self.extracted_text else additional_text
+            print(f"Added {len(chunks)} chunks to FAISS index.")
+            return True
+        except Exception as e:
+            print(f"Error extending vector store ({type(e).__name__}): {e}")
+            return False
+
+
     # --- IMPLEMENTED IN PHASE 4 ---
-    def extract_metadata(self):
-        """Extracts all target metadata fields using RAG."""
+    def extract_metadata(self, field_names=None):
+        """Extracts target metadata fields using RAG. All fields unless field_names is given."""
         print("Starting metadata extraction...")
         if not self.retriever:
             print("Error: Document not indexed (Retriever not ready). Cannot extract metadata.")
             return None # Indicate failure
 
         metadata = {}
-        # Define the fields, queries, and specific extraction instructions
-        target_fields = [
-            {"name": "Agreement Value",
-             "query": "What is the primary monetary value of the agreement, such as monthly rent, total rent, or security deposit amount?",
-             "format": "Extract ONLY the monetary value mentioned (e.g., '1500/month', 'Rupees 18,000', 'Rs.2000', '50000 rupees'). If multiple values exist (like rent and deposit), prioritize rent. If no value is found, return 'Not Found'."},
-            {"name": "Agreement Start Date",
-             "query": "What is the commencement date, start date, or effective date of this agreement?",
-             "format": "Extract ONLY the date. Return the date in YYYY-MM-DD format if possible, otherwise return the date as written. If no date is found, return 'Not Found'."},
-            {"name": "Agreement End Date",
-             "query": "What is the termination date, end date, or expiration date of this agreement term?",
-             "format": "Extract ONLY the date. Return the date in YYYY-MM-DD format if possible, otherwise return the date as written. If no date is found, return 'Not Found'."},
-            {"name": "Renewal Notice (Days)",
-             "query": "How many days notice is required before the end date for renewal or non-renewal termination? Look for phrases like 'notice period', 'days prior', 'written notice'.",
-             "format": "Extract ONLY the number of days (e.g., 30, 60, 90). Ignore other details. If no specific number of days is mentioned, return 'Not Found'."},
-            {"name": "Party One",
-             "query": "Identify the full name of the Tenant(s), Lessee(s), Resident(s), or the primary party agreeing to rent (often listed first or defined as such).",
-             "format": "Extract ONLY the full name(s) of the tenant/lessee/first party. If multiple tenants, list them separated by 'and' or commas as written. If not clearly identified, return 'Not Found'."},
-            {"name": "Party Two",
-             "query": "Identify the full name of the Landlord, Lessor, Owner, Property Manager, or the second party providing the rental property.",
-             "format": "Extract ONLY the full name(s) or company name of the landlord/lessor/second party. If not clearly identified, return 'Not Found'."}
-        ]
+        statuses = {}
+        sources = {}
+        self.field_statuses = statuses
+        self.field_sources = sources
+        # Restrict to the requested fields (used by progressive extraction)
+        target_fields = [f for f in TARGET_FIELDS if field_names is None or f["name"] in field_names]
 
         # --- Setup RAG Chain (Can be defined once if reusable) ---
         # Using a simple RetrievalQA chain for this example
@@ -138,7 +216,7 @@ class RentalAgreementAgent:
                 llm=self.llm,
                 chain_type="stuff", # "stuff" puts all retrieved docs into the context
                 retriever=self.retriever,
-                return_source_documents=False, # We only need the answer
+                return_source_documents=True, # Kept to tell which chunks each answer came from
                 chain_type_kwargs={
                     "prompt": PromptTemplate(
                         template="""Use the following pieces of context to answer the question at the end.
@@ -165,7 +243,7 @@ Answer:""",
         total_fields = len(target_fields)
         for i, field_info in enumerate(target_fields):
             field_name = field_info["name"]
-            query_with_format = f"{field_info['query']} Instruction: {field_info['format']}"
+            query_with_format = _field_query(field_info)
             print(f"({i+1}/{total_fields}) Extracting field: {field_name}...")
 
             try:
@@ -176,15 +254,18 @@ Answer:""",
                 # Invoke the RAG chain
                 response_dict = qa_chain.invoke({"query": query_with_format})
                 raw_answer = response_dict.get("result", "Error: No result key")
+                sources[field_name] = [doc.page_content for doc in response_dict.get("source_documents", [])]
 
                 # --- Basic Parsing/Cleaning ---
                 # Remove potential markdown, leading/trailing spaces, handle "Not Found"
                 cleaned_answer = raw_answer.strip().strip('`').strip()
                 if "not found" in cleaned_answer.lower() or not cleaned_answer:
-                    metadata[field_name] = "Not Found"
+                    metadata[field_name] = NOT_FOUND_VALUE
+                    statuses[field_name] = FieldStatus.NOT_FOUND
                 else:
                      # Add more specific cleaning per field if needed (e.g., date formatting)
                      metadata[field_name] = cleaned_answer
+                     statuses[field_name] = FieldStatus.FOUND
 
                 print(f"  Raw answer: '{raw_answer}' -> Cleaned: '{metadata[field_name]}'")
 
@@ -194,17 +275,124 @@ Answer:""",
                 if "quota" in str(e).lower() or "429" in str(e):
                      print("RATE LIMIT HIT! Consider increasing sleep time or checking your plan.")
                      # You might want to stop the whole process here or just mark field as error
-                     metadata[field_name] = "Rate Limit Error"
+                     metadata[field_name] = RATE_LIMIT_ERROR_VALUE
+                     statuses[field_name] = FieldStatus.RATE_LIMITED
                      # Optionally break the loop if rate limited
                      # break
                 else:
-                    metadata[field_name] = "Extraction Error"
+                    metadata[field_name] = EXTRACTION_ERROR_VALUE
+                    statuses[field_name] = FieldStatus.ERROR
 
 
         print(f"Finished metadata extraction. Result: {metadata}")
         return metadata
 
 
+    def extract_metadata_progressive(self, load_pages, total_pages, pages_processed, page_batch=5,
+                                     template_metadata=None, template_sources=None):
+        """
+        Extracts metadata from the already indexed pages, then indexes further pages
+        in batches only while some fields are still 'Not Found'.
+
+        Args:
+            load_pages: Callable (start_page, max_pages) -> str or None, returning the text of those pages.
+            total_pages (int): Total number of pages in the document.
+            pages_processed (int): Number of leading pages already indexed.
+            page_batch (int): Number of pages to extract and index per expansion step.
+            template_metadata (dict): Results of a near-duplicate document; the first pass then
+                goes through extract_metadata_from_template.
+            template_sources (dict): Field sources stored with template_metadata.
+
+        Returns:
+            dict: The merged metadata, or None if the initial extraction failed.
+        """
+        self.pages_processed = pages_processed
+        if template_metadata is not None:
+            metadata = self.extract_metadata_from_template(template_metadata, template_sources)
+        else:
+            metadata = self.extract_metadata()
+        if metadata is None:
+            return None
+        statuses = dict(self.field_statuses)
+        sources = dict(self.field_sources)
+
+        while self.pages_processed < total_pages:
+            missing_fields = [name for name, status in statuses.items() if status == FieldStatus.NOT_FOUND]
+            if not missing_fields:
+                print(f"All fields found after {self.pages_processed}/{total_pages} pages. Stopping early.")
+                break
+            print(f"Fields still missing {missing_fields}. Expanding past page {self.pages_processed}...")
+            next_text = load_pages(self.pages_processed, page_batch)
+            self.pages_processed = min(total_pages, self.pages_processed + page_batch)
+            if not next_text or not self.add_text_to_index(next_text):
+                continue # Nothing usable on these pages, try the next batch
+            new_metadata = self.extract_metadata(field_names=missing_fields)
+            if new_metadata:
+                for name, status in self.field_statuses.items():
+                    if status == FieldStatus.FOUND:
+                        metadata[name] = new_metadata[name]
+                        statuses[name] = status
+                        sources[name] = self.field_sources.get(name, [])
+
+        self.field_statuses = statuses
+        self.field_sources = sources
+        print(f"Progressive extraction processed {self.pages_processed}/{total_pages} pages.")
+        return metadata
+
+
+    def extract_metadata_from_template(self, template_metadata, template_sources=None):
+        """
+        Extracts metadata for a near-duplicate of an already processed document.
+        A template value is reused only when this document retrieves exactly the same
+        chunks for that field as the template did, i.e. the answer's context is unchanged.
+        Every other field (its supporting spans differ, or it was not found) is re-extracted.
+
+        Args:
+            template_metadata (dict): Results stored for the template document.
+            template_sources (dict): Field name -> chunk texts the template answers came from.
+
+        Returns:
+            dict: The merged metadata, or None if re-extraction failed.
+        """
+        if not self.retriever:
+            print("Error: Document not indexed (Retriever not ready). Cannot extract metadata.")
+            return None
+        template_metadata = template_metadata or {}
+        template_sources = template_sources or {}
+        metadata = {}
+        statuses = {}
+        sources = {}
+        for field_info in TARGET_FIELDS:
+            field_name = field_info["name"]
+            value = template_metadata.get(field_name)
+            supporting_chunks = template_sources.get(field_name)
+            if not isinstance(value, str) or value in (NOT_FOUND_VALUE, EXTRACTION_ERROR_VALUE, RATE_LIMIT_ERROR_VALUE) \
+                    or not supporting_chunks:
+                continue
+            try:
+                retrieved = [doc.page_content for doc in self.retriever.invoke(_field_query(field_info))]
+            except Exception as e:
+                print(f"  Error retrieving context for '{field_name}' ({type(e).__name__}): {e}")
+                continue
+            if sorted(retrieved) == sorted(supporting_chunks):
+                metadata[field_name] = value
+                statuses[field_name] = FieldStatus.FOUND
+                sources[field_name] = supporting_chunks
+        fields_to_extract = [f["name"] for f in TARGET_FIELDS if f["name"] not in metadata]
+        print(f"Reusing template values for {list(metadata)}. Re-extracting {fields_to_extract}.")
+        if fields_to_extract:
+            new_metadata = self.extract_metadata(field_names=fields_to_extract)
+            if new_metadata is None:
+                return None
+            metadata.update(new_metadata)
+            statuses.update(self.field_statuses)
+            sources.update(self.field_sources)
+        # Keep the usual field order
+        self.field_statuses = {name: statuses[name] for name in metadata}
+        self.field_sources = {name: sources[name] for name in metadata if name in sources}
+        return {f["name"]: metadata[f["name"]] for f in TARGET_FIELDS if f["name"] in metadata}
+
+
     # --- Helper for parsing (can be expanded) ---
     # def _parse_llm_output(self, result, field_name):
     #     # Add more sophisticated parsing here based on field_name
@@ -222,4 +410,7 @@ Answer:""",
         print("Agent cleanup called.")
         self.vector_store = None
         self.retriever = None
-        self.extracted_text = None
\ No newline at end of file
+        self.extracted_text = None
+        self.pages_processed = None
+        self.field_statuses = {}
+        self.field_sources = {}
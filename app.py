@@ -4,6 +4,7 @@ import os
 from dotenv import load_dotenv
 import ui
 import pdf_utils
+import similarity_index
 from agents import RentalAgreementAgent
 import time
 
@@ -32,8 +33,25 @@ if 'extracted_text' not in st.session_state: st.session_state.extracted_text = N
 if 'agent' not in st.session_state: st.session_state.agent = None
 if 'rag_index_ready' not in st.session_state: st.session_state.rag_index_ready = False
 if 'extracted_metadata' not in st.session_state: st.session_state.extracted_metadata = None
+if 'field_statuses' not in st.session_state: st.session_state.field_statuses = None # FieldStatus per field from the agent
 if 'processing_error' not in st.session_state: st.session_state.processing_error = None
 if 'is_processing' not in st.session_state: st.session_state.is_processing = False # General processing flag
+if 'total_pages' not in st.session_state: st.session_state.total_pages = 0
+if 'pages_processed' not in st.session_state: st.session_state.pages_processed = 0 # Pages actually extracted and indexed
+if 'progressive_mode' not in st.session_state: st.session_state.progressive_mode = False # Mode fixed when text extraction ran
+if 'duplicate_kind' not in st.session_state: st.session_state.duplicate_kind = None # "exact", "near" or None
+if 'duplicate_doc_id' not in st.session_state: st.session_state.duplicate_doc_id = None # Matching stored document
+if 'file_hash' not in st.session_state: st.session_state.file_hash = None # SHA-256 of the uploaded bytes
+
+# --- Progressive Mode: parties, dates and rent are almost always in the first pages ---
+PROGRESSIVE_INITIAL_PAGES = 3 # Pages extracted and indexed up front
+PROGRESSIVE_PAGE_BATCH = 5 # Further pages indexed per step while fields are 'Not Found'
+
+
+# --- Similarity Index (shared by all sessions) ---
+@st.cache_resource
+def get_similarity_index():
+    return similarity_index.DocumentSimilarityIndex()
 
 
 # --- Initialize Agent ---
@@ -66,6 +84,11 @@ def main():
         type=ACCEPTED_TYPES, # Use the combined list
         accept_multiple_files=False # Keep as single file
     )
+    progressive_mode = st.checkbox(
+        f"Progressive mode (start with the first {PROGRESSIVE_INITIAL_PAGES} pages, read further only for missing fields)",
+        value=True,
+        disabled=st.session_state.get('is_processing', False)
+    )
 
     # --- Step 2: Process Upload & Extract Text ---
     if uploaded_file:
@@ -77,7 +100,13 @@ def main():
             st.session_state.extracted_text = None
             st.session_state.rag_index_ready = False
             st.session_state.extracted_metadata = None
+            st.session_state.field_statuses = None
             st.session_state.processing_error = None
+            st.session_state.total_pages = 0
+            st.session_state.pages_processed = 0
+            st.session_state.duplicate_kind = None
+            st.session_state.duplicate_doc_id = None
+            st.session_state.file_hash = None
             st.session_state.is_processing = True # Start processing immediately
             st.rerun() # Rerun to show spinner and start extraction
             
@@ -88,14 +117,35 @@ def main():
                 text_result = None
                 error_msg = None
                 try:
+                    st.session_state.progressive_mode = progressive_mode # Later steps follow the mode the text was extracted with
+                    total_pages = pdf_utils.get_page_count(uploaded_file)
                     # --- This is the call ---
-                    extracted_text_result = pdf_utils.extract_text_from_file(uploaded_file)
+                    if progressive_mode:
+                        # Reads past leading pages without text instead of failing the upload
+                        extracted_text_result, pages_processed = pdf_utils.extract_leading_text(
+                            uploaded_file, total_pages, PROGRESSIVE_INITIAL_PAGES, PROGRESSIVE_PAGE_BATCH
+                        )
+                    else:
+                        extracted_text_result = pdf_utils.extract_text_from_file(uploaded_file)
+                        pages_processed = total_pages
                     # --- End of call ---
+                    st.session_state.total_pages = total_pages
+                    st.session_state.pages_processed = pages_processed
 
                     if not extracted_text_result:
                         error_msg = f"Could not extract text from '{st.session_state.uploaded_filename}'."
                     else:
                          text_result = extracted_text_result # Assign if successful
+                         # Check against previously processed documents. Text of only the first
+                         # pages can't prove an exact duplicate; identical file bytes can.
+                         st.session_state.file_hash = similarity_index.file_fingerprint(uploaded_file.getvalue())
+                         kind, doc_id, _ = get_similarity_index().find(
+                             text_result,
+                             file_hash=st.session_state.file_hash,
+                             complete=st.session_state.pages_processed >= total_pages
+                         )
+                         st.session_state.duplicate_kind = kind
+                         st.session_state.duplicate_doc_id = doc_id
 
                 except Exception as e: # <--- THIS BLOCK IS LIKELY RUNNING
                     # Constructing the error message using the exception 'e'
@@ -138,7 +188,15 @@ def main():
                  error_msg = None
                  if agent and current_text:
                      try:
-                         success = agent.load_and_index_document(current_text)
+                         duplicate_kind = st.session_state.duplicate_kind
+                         index_path = get_similarity_index().index_path(st.session_state.duplicate_doc_id) if duplicate_kind else None
+                         if duplicate_kind == "exact":
+                             success = agent.load_saved_index(current_text, index_path)
+                             if not success: # Stored index unusable, index from scratch
+                                 st.session_state.duplicate_kind = None
+                         if not success:
+                             template_index_path = index_path if duplicate_kind == "near" else None
+                             success = agent.load_and_index_document(current_text, template_index_path=template_index_path)
                      except Exception as e:
                          error_msg = f"Error during document processing: {str(e)}"
                          print(f"Error calling load_and_index_document: {e}")
@@ -161,6 +219,7 @@ def main():
                  st.session_state.is_processing = True
                  st.session_state.processing_error = None # Clear previous error
                  st.session_state.extracted_metadata = None # Clear old results
+                 st.session_state.field_statuses = None
                  st.rerun()
 
         # --- Metadata Extraction Action ---
@@ -170,15 +229,49 @@ def main():
                 with st.spinner("AI is analyzing the document..."):
                     agent = st.session_state.agent
                     metadata_result = None
+                    statuses_result = None
                     error_msg = None
                     if agent:
                         try:
-                            metadata_result = agent.extract_metadata()
+                            duplicate_kind = st.session_state.duplicate_kind
+                            similarity_store = get_similarity_index()
+                            stored_metadata = similarity_store.load_metadata(st.session_state.duplicate_doc_id) if duplicate_kind else None
+                            template_metadata = stored_metadata if duplicate_kind == "near" else None
+                            template_sources = similarity_store.load_sources(st.session_state.duplicate_doc_id) if template_metadata else None
+                            if duplicate_kind == "exact" and stored_metadata:
+                                metadata_result = stored_metadata # Same document, reuse previous results
+                            elif st.session_state.progressive_mode and st.session_state.pages_processed < st.session_state.total_pages:
+                                # Near duplicates start from the template and expand pages the same way
+                                metadata_result = agent.extract_metadata_progressive(
+                                    lambda start_page, max_pages: pdf_utils.extract_text_from_file(uploaded_file, start_page, max_pages),
+                                    st.session_state.total_pages,
+                                    st.session_state.pages_processed,
+                                    page_batch=PROGRESSIVE_PAGE_BATCH,
+                                    template_metadata=template_metadata,
+                                    template_sources=template_sources
+                                )
+                                st.session_state.pages_processed = agent.pages_processed
+                            elif template_metadata:
+                                metadata_result = agent.extract_metadata_from_template(template_metadata, template_sources)
+                            else:
+                                metadata_result = agent.extract_metadata()
+                            if duplicate_kind != "exact" or not stored_metadata:
+                                statuses_result = dict(agent.field_statuses)
                         except Exception as e:
                             error_msg = f"Error during metadata extraction: {str(e)}"
                             print(f"Error calling extract_metadata: {e}")
 
                     st.session_state.extracted_metadata = metadata_result
+                    st.session_state.field_statuses = statuses_result
+                    # Remember newly extracted documents without errors for later reuse
+                    if metadata_result and statuses_result \
+                            and not any(status.is_error for status in statuses_result.values()):
+                        get_similarity_index().add(
+                            agent.extracted_text, st.session_state.uploaded_filename, metadata_result, agent.save_index,
+                            sources=agent.field_sources,
+                            file_hash=st.session_state.file_hash,
+                            complete=st.session_state.pages_processed >= st.session_state.total_pages
+                        ) # Skipped if this document is already stored
                     if not metadata_result and not error_msg:
                         error_msg = "Metadata extraction failed or returned no results."
                     st.session_state.processing_error = error_msg
@@ -190,7 +283,14 @@ def main():
     current_metadata = st.session_state.get('extracted_metadata', None)
     if current_metadata:
          # Display table even if there were non-critical extraction errors handled within the dict
-         ui.display_metadata_table(current_metadata, st.session_state.get('uploaded_filename', ''))
+         ui.display_metadata_table(current_metadata, st.session_state.get('uploaded_filename', ''),
+                                   st.session_state.get('field_statuses'))
+         if st.session_state.get('duplicate_kind') == "exact":
+             st.caption("Identical to a previously processed document: stored results reused.")
+         elif st.session_state.get('duplicate_kind') == "near":
+             st.caption("Same template as a previously processed document: only fields whose context changed were re-extracted.")
+         if st.session_state.get('total_pages', 0) > 1 and st.session_state.get('duplicate_kind') != "exact":
+             st.caption(f"Pages processed: {st.session_state.pages_processed} of {st.session_state.total_pages}")
          # Display specific extraction error if one was set
          if st.session_state.get('processing_error') and "extraction" in st.session_state.processing_error.lower():
              ui.display_processing_message("warning", st.session_state.processing_error)
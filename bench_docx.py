@@ -0,0 +1,85 @@
+# bench_docx.py
+"""
+Benchmarks DOCX text extraction: the streaming XML engine (docx_utils) against
+the previous python-docx path (document.paragraphs only).
+
+Builds synthetic agreements of increasing size with python-docx, then reports
+wall time, peak Python memory (tracemalloc) and extracted text length.
+python-docx keeps its lxml tree in C memory that tracemalloc does not see,
+so its peak figure understates the real footprint.
+
+Usage:
+    python bench_docx.py [--pages 10 100 1000] [--repeat 3]
+"""
+
+import argparse
+import io
+import time
+import tracemalloc
+
+import docx
+
+import docx_utils
+
+
+def build_agreement(pages):
+    """Builds a synthetic rental agreement DOCX (~1 page = 20 clauses + a rent schedule table)."""
+    document = docx.Document()
+    document.sections[0].header.paragraphs[0].text = "LEASE AGREEMENT between Landlord Properties Pvt Ltd and Ravi Kumar"
+    document.sections[0].footer.paragraphs[0].text = "Initials: ______ / ______"
+    for page in range(pages):
+        document.add_heading(f"Schedule {page + 1}", level=2)
+        for clause in range(20):
+            document.add_paragraph(
+                f"{page + 1}.{clause + 1} The Tenant shall pay the monthly rent of Rs. 18,000 on or before "
+                f"the fifth day of each month and shall maintain the premises in good condition."
+            )
+        table = document.add_table(rows=4, cols=3)
+        for row_idx, row in enumerate(table.rows):
+            for col_idx, cell in enumerate(row.cells):
+                cell.text = f"Month {row_idx + 1}" if col_idx == 0 else f"Rs. {18000 + 500 * col_idx}"
+    output = io.BytesIO()
+    document.save(output)
+    return output.getvalue()
+
+
+def extract_python_docx(docx_bytes):
+    """The previous extraction path: python-docx, body paragraphs only."""
+    document = docx.Document(io.BytesIO(docx_bytes))
+    return "\n\n".join(para.text for para in document.paragraphs if para.text).strip()
+
+
+def extract_streaming(docx_bytes):
+    return docx_utils.extract_docx_text(io.BytesIO(docx_bytes))
+
+
+def measure(extractor, docx_bytes, repeat):
+    """Returns (best seconds, peak MB, text length) over `repeat` runs."""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        text = extractor(docx_bytes)
+        best = min(best, time.perf_counter() - start)
+    tracemalloc.start()
+    extractor(docx_bytes)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return best, peak / 2**20, len(text or "")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pages", type=int, nargs="+", default=[10, 100, 500])
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    print(f"{'pages':>6} {'size KB':>8} | {'engine':<12} {'time s':>8} {'peak MB':>8} {'chars':>9}")
+    for pages in args.pages:
+        docx_bytes = build_agreement(pages)
+        for name, extractor in (("python-docx", extract_python_docx), ("streaming", extract_streaming)):
+            seconds, peak_mb, chars = measure(extractor, docx_bytes, args.repeat)
+            print(f"{pages:>6} {len(docx_bytes) // 1024:>8} | {name:<12} {seconds:>8.3f} {peak_mb:>8.1f} {chars:>9}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,159 @@
+# docx_utils.py
+
+import re
+import zipfile
+import xml.etree.ElementTree as ET
+
+# --- WordprocessingML namespaces ---
+_W = "{http://schemas.openxmlformats.org/wordprocessingml/2006/main}"
+_MC_FALLBACK = "{http://schemas.openxmlformats.org/markup-compatibility/2006}Fallback"
+
+_P, _T, _TAB, _BR, _CR = _W + "p", _W + "t", _W + "tab", _W + "br", _W + "cr"
+_TBL, _TR, _TC = _W + "tbl", _W + "tr", _W + "tc"
+_BODY = _W + "body"
+
+_DOCUMENT_PART = "word/document.xml"
+_HEADER_RE = re.compile(r"^word/header\d*\.xml$")
+_FOOTER_RE = re.compile(r"^word/footer\d*\.xml$")
+
+
+def _iter_part_blocks(xml_stream):
+    """
+    Stream-parses one WordprocessingML part (document, header or footer).
+
+    Yields:
+        ("paragraph", str) for body and text box paragraphs, in document order.
+        ("table", list[list[str]]) for each top-level table, one list of cell texts per row.
+    Nested tables are flattened into the text of the cell that contains them.
+    """
+    paragraph_stack = [] # Text fragments of open paragraphs (text boxes nest paragraphs)
+    table_stack = [] # Open tables: list of rows
+    row_stack = [] # Open rows: list of cell texts
+    cell_stack = [] # Open cells: list of paragraph texts
+    fallback_depth = 0 # Inside mc:Fallback (duplicate of the mc:Choice content)
+    depth = 0
+    root = None
+    body = None
+
+    for event, elem in ET.iterparse(xml_stream, events=("start", "end")):
+        tag = elem.tag
+        if event == "start":
+            depth += 1
+            if depth == 1:
+                root = elem
+            elif tag == _BODY:
+                body = elem
+            if tag == _MC_FALLBACK:
+                fallback_depth += 1
+            elif fallback_depth:
+                continue
+            elif tag == _P:
+                paragraph_stack.append([])
+            elif tag == _TBL:
+                table_stack.append([])
+            elif tag == _TR:
+                row_stack.append([])
+            elif tag == _TC:
+                cell_stack.append([])
+            continue
+
+        depth -= 1
+        if tag == _MC_FALLBACK:
+            fallback_depth -= 1
+        elif fallback_depth:
+            pass
+        elif tag == _T and paragraph_stack:
+            paragraph_stack[-1].append(elem.text or "")
+        elif tag == _TAB and paragraph_stack:
+            paragraph_stack[-1].append("\t")
+        elif tag in (_BR, _CR) and paragraph_stack:
+            paragraph_stack[-1].append("\n")
+        elif tag == _P and paragraph_stack:
+            text = "".join(paragraph_stack.pop()).strip()
+            if text:
+                if cell_stack:
+                    cell_stack[-1].append(text)
+                else:
+                    yield "paragraph", text
+        elif tag == _TC and cell_stack:
+            cell_text = "\n".join(cell_stack.pop())
+            if row_stack:
+                row_stack[-1].append(cell_text)
+        elif tag == _TR and row_stack:
+            row = row_stack.pop()
+            if table_stack and any(row):
+                table_stack[-1].append(row)
+        elif tag == _TBL and table_stack:
+            rows = table_stack.pop()
+            if cell_stack: # Nested table, keep its text in the enclosing cell
+                cell_stack[-1].extend(_format_table(rows).splitlines())
+            elif rows:
+                yield "table", rows
+
+        # Keep memory flat: release finished paragraphs/rows and top-level blocks
+        if tag in (_P, _TR):
+            elem.clear()
+        if body is not None and depth == 2:
+            body.clear()
+        elif body is None and depth == 1: # Headers/footers have no w:body
+            root.clear()
+
+
+def _format_table(rows):
+    """Renders table rows as one line per row with ' | ' between cells."""
+    return "\n".join(" | ".join(cell.replace("\n", " ") for cell in row) for row in rows)
+
+
+def iter_docx_blocks(docx_file_object):
+    """
+    Streams the content of a DOCX file straight from the zip: headers first
+    (party blocks often live there), then the document body including tables
+    and text boxes, then footers. Identical header/footer parts are emitted once.
+
+    Args:
+        docx_file_object: Path or binary file object of the DOCX.
+
+    Yields:
+        tuple: ("paragraph", str) or ("table", list[list[str]]).
+    """
+    with zipfile.ZipFile(docx_file_object) as archive:
+        names = archive.namelist()
+        headers = sorted(n for n in names if _HEADER_RE.match(n))
+        footers = sorted(n for n in names if _FOOTER_RE.match(n))
+        seen_parts = set()
+        for part in headers + [_DOCUMENT_PART] + footers:
+            if part not in names:
+                continue
+            with archive.open(part) as xml_stream:
+                if part == _DOCUMENT_PART:
+                    yield from _iter_part_blocks(xml_stream) # Body can be huge, don't buffer it
+                    continue
+                blocks = list(_iter_part_blocks(xml_stream))
+            # First/even/default headers are often identical
+            key = repr(blocks)
+            if blocks and key not in seen_parts:
+                seen_parts.add(key)
+                yield from blocks
+
+
+def extract_docx_tables(docx_file_object):
+    """Returns every table in the DOCX as a list of rows (lists of cell texts)."""
+    return [rows for kind, rows in iter_docx_blocks(docx_file_object) if kind == "table"]
+
+
+def extract_docx_text(docx_file_object):
+    """
+    Extracts text from a DOCX, including tables (one ' | '-separated line per row),
+    headers, footers and text boxes.
+
+    Returns:
+        str: The extracted text, or None if the file is empty or not a valid DOCX.
+    """
+    try:
+        parts = [value if kind == "paragraph" else _format_table(value)
+                 for kind, value in iter_docx_blocks(docx_file_object)]
+    except (zipfile.BadZipFile, ET.ParseError, KeyError) as e:
+        print(f"Error parsing DOCX XML: {e}")
+        return None
+    result = "\n\n".join(parts).strip()
+    return result if result else None
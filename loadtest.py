@@ -0,0 +1,413 @@
+# loadtest.py
+"""
+Headless load test for app.py using Streamlit's AppTest.
+
+Each simulated session runs the real app script in this process, the way one
+Streamlit server runs one script thread per browser session:
+    initialize  -> first script run (initialize_agent)
+    upload      -> upload a synthetic agreement (text extraction + st.rerun cycles;
+                   PDFs start with the first pages in progressive mode)
+    index       -> click "Process Document" (chunk, embed, FAISS)
+    extract     -> click "Extract Key Information" (RAG extraction)
+
+Gemini is replaced by an offline stand-in with configurable latency, so no API
+key or network is needed and the numbers reflect the app's own overhead plus
+whatever latency you emulate. The stand-in embeds hashed bag-of-words vectors
+and answers a field only when its clause is in the retrieved context, so fields
+missing from the indexed pages come back 'Not Found' as they would with Gemini.
+
+Synthetic PDFs open with an image-only stamp-paper cover (which sends extraction
+through the OCR fallback) and keep the term and notice clause on the last page,
+so progressive mode has to expand past the first pages to find the dates and
+notice period. OCR needs Tesseract installed; without it the fallback still
+renders every page but the per-page OCR calls fail and the PyPDF2 text is used.
+
+Every session uploads a different synthetic agreement, and the similarity store
+(duplicate reuse) is disabled by default, so every level measures the same full
+extraction path. With --keep-store the store is enabled, but each level starts
+from an empty one so levels still see comparable hit rates.
+
+Concurrency is ramped through --levels; for each level the report gives
+per-step latency percentiles, throughput, and RSS growth per live session.
+RSS growth is a process-wide delta: the allocator reuses memory freed by earlier
+levels, so values under ~1 MB are noise and negative deltas are shown as 0.
+The saturation point is the first level after which adding sessions raises
+throughput by less than --saturation-gain.
+
+Usage:
+    python loadtest.py [--levels 1 2 4 8 16] [--llm-latency 0.2] [--embed-latency 0.05]
+                       [--rate-limit-sleep 0] [--formats txt docx pdf] [--pdf-pages 8] [--keep-store]
+"""
+
+import argparse
+import gc
+import io
+import os
+import random
+import re
+import resource
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import MagicMock
+
+import numpy as np
+from langchain_community.embeddings import DeterministicFakeEmbedding
+from langchain_core.language_models.chat_models import SimpleChatModel
+from streamlit import config
+from streamlit.runtime.caching.storage.dummy_cache_storage import MemoryCacheStorageManager
+from streamlit.runtime.media_file_manager import MediaFileManager
+from streamlit.runtime.memory_media_file_storage import MemoryMediaFileStorage
+from streamlit.runtime.runtime import Runtime
+from streamlit.runtime.scriptrunner.script_cache import ScriptCache
+from streamlit.testing.v1 import AppTest, app_test, local_script_runner
+
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+APP_PATH = os.path.join(APP_DIR, "app.py")
+sys.path.insert(0, APP_DIR)
+
+import agents # Patched below so every session's agent uses the offline stand-in
+import similarity_index
+import streamlit as st
+
+STEPS = ["initialize", "upload", "index", "extract"]
+SCRIPT_TIMEOUT = 600 # Seconds allowed per AppTest run
+
+_TENANTS = ["Ravi Kumar", "Anita Rao", "John Smith", "Priya Sharma", "Mohammed Ali", "Sara Thomas"]
+_LANDLORDS = ["Landlord Properties Pvt Ltd", "K. Venkatesh", "Mary Jones", "Green Estates LLP"]
+# (text in the field's question, text the retrieved context must contain, answer)
+_STAND_IN_ANSWERS = [
+    ("monetary value", "monthly rent", "Rs. 18,000 per month"),
+    ("commencement date", "term commences", "2024-01-01"),
+    ("termination date", "term commences", "2024-12-31"),
+    ("days notice", "written notice", "30"),
+    ("Tenant(s)", "(the tenant)", "Ravi Kumar"),
+    ("Landlord, Lessor", "(the landlord)", "Landlord Properties Pvt Ltd"),
+]
+_STOP_WORDS = {"the", "and", "for", "any", "this", "that", "with", "shall", "not", "only", "such", "other"}
+
+
+# --- Offline Model Stand-in ---
+def _bag_of_words(text, size):
+    """Unit vector of hashed word counts: texts sharing words get similar embeddings."""
+    vector = np.zeros(size)
+    for word in re.findall(r"[a-z]{3,}", text.lower()):
+        if word not in _STOP_WORDS:
+            vector[zlib.crc32(word.encode("utf-8")) % size] += 1.0
+    norm = np.linalg.norm(vector)
+    return (vector / norm if norm else vector).tolist()
+
+
+class OfflineEmbeddings(DeterministicFakeEmbedding):
+    """Hashed bag-of-words embeddings with emulated per-call latency. Thread-safe (no global RNG)."""
+    latency: float = 0.0
+
+    def embed_documents(self, texts):
+        time.sleep(self.latency)
+        return [_bag_of_words(text, self.size) for text in texts]
+
+    def embed_query(self, text):
+        time.sleep(self.latency)
+        return _bag_of_words(text, self.size)
+
+
+class OfflineChatModel(SimpleChatModel):
+    """Answers a field only when its clause is in the retrieved context, otherwise 'Not Found'."""
+    latency: float = 0.0
+
+    @property
+    def _llm_type(self):
+        return "offline-load-test"
+
+    def _call(self, messages, stop=None, run_manager=None, **kwargs):
+        time.sleep(self.latency)
+        context, _, question = messages[-1].content.rpartition("Question:")
+        for question_text, context_text, answer in _STAND_IN_ANSWERS:
+            if question_text in question:
+                return answer if context_text in context.lower() else "Not Found"
+        return "Not Found"
+
+
+def install_offline_models(llm_latency, embed_latency, rate_limit_sleep):
+    """Swaps the Gemini classes used by agents.RentalAgreementAgent for offline stand-ins."""
+    agents.ChatGoogleGenerativeAI = lambda **kwargs: OfflineChatModel(latency=llm_latency)
+    agents.GoogleGenerativeAIEmbeddings = lambda **kwargs: OfflineEmbeddings(size=768, latency=embed_latency)
+    # extract_metadata sleeps 2s per field for Gemini rate limits; scale it (0 = off)
+    real_sleep = time.sleep
+    agents.time = type("ScaledTime", (), {"sleep": staticmethod(lambda s: real_sleep(s * rate_limit_sleep))})
+    os.environ.setdefault("GOOGLE_API_KEY", "offline-load-test")
+
+
+def share_runtime_across_sessions():
+    """
+    AppTest installs a mock Runtime singleton for each run and resets it to None
+    when the run ends, so overlapping runs in different threads break each other.
+    Pin one shared mock runtime (like the single Runtime of a real server) instead.
+    Sessions also share one script cache, as on a server: each AppTest otherwise
+    compiles app.py itself, and concurrent compiles can fail in CPython 3.11
+    ("AST constructor recursion depth mismatch").
+    """
+    shared_runtime = MagicMock(spec=Runtime)
+    shared_runtime.media_file_mgr = MediaFileManager(MemoryMediaFileStorage("/mock/media"))
+    shared_runtime.cache_storage_manager = MemoryCacheStorageManager()
+    Runtime.instance = classmethod(lambda cls: shared_runtime)
+    Runtime.exists = classmethod(lambda cls: True)
+    shared_script_cache = ScriptCache() # Compiles under its own lock
+    app_test.ScriptCache = local_script_runner.ScriptCache = lambda: shared_script_cache
+    # AppTest patches this option per run and restores it afterwards; keep it set throughout
+    config.set_option("global.appTest", True)
+
+
+def disable_similarity_store():
+    """Makes every upload a miss and skips storing, so no session reuses another's results."""
+    similarity_index.DocumentSimilarityIndex.find = lambda self, text, file_hash=None, complete=True: (None, None, 0.0)
+    similarity_index.DocumentSimilarityIndex.add = lambda self, *args, **kwargs: None
+
+
+def fresh_similarity_store():
+    """Points the app's store at a new empty temp directory. Returns the directory."""
+    work_dir = tempfile.mkdtemp(prefix="loadtest_")
+    os.chdir(work_dir) # The store path is relative to the working directory
+    st.cache_resource.clear() # Drop the cached get_similarity_index() instance
+    return work_dir
+
+
+# --- Synthetic Corpus ---
+def build_agreement_paragraphs(rng, clauses, number):
+    """Paragraphs of a synthetic agreement; parties and rent come first, term and notice last."""
+    tenant, landlord = rng.choice(_TENANTS), rng.choice(_LANDLORDS)
+    rent = rng.randrange(8000, 60000, 500)
+    start = f"20{rng.randint(20, 26)}-{rng.randint(1, 12):02d}-01"
+    paragraphs = [
+        f"RENTAL AGREEMENT No. {number}", # Keeps every session's document unique
+        f"This agreement is made between {landlord} (the Landlord) and {tenant} (the Tenant).",
+        f"The Tenant shall pay a monthly rent of Rs. {rent:,} and a security deposit of Rs. {rent * 3:,}.",
+    ]
+    paragraphs += [f"{i + 1}. The Tenant shall keep the premises in good repair and shall not sublet "
+                   f"without the Landlord's consent (clause {i + 1})." for i in range(clauses)]
+    paragraphs.append(f"The term commences on {start} for eleven months. Either party may terminate with "
+                      f"{rng.choice([30, 60, 90])} days written notice.")
+    return paragraphs
+
+
+def build_pdf(paragraphs, pages):
+    """
+    Lays the paragraphs out over `pages` PDF pages: an image-only stamp-paper cover
+    (no text layer, so extraction falls back to OCR), then the text spread evenly.
+    """
+    import fitz
+
+    document = fitz.open()
+    stamp = fitz.open()
+    stamp.new_page().insert_text((72, 100), "INDIA NON JUDICIAL  -  STAMP PAPER  -  Rs. 100", fontsize=16)
+    cover = document.new_page()
+    cover.insert_image(cover.rect, pixmap=stamp[0].get_pixmap(dpi=72))
+    stamp.close()
+
+    per_page = -(-len(paragraphs) // max(1, pages - 1)) # Ceiling division
+    for start in range(0, len(paragraphs), per_page):
+        page = document.new_page()
+        text = "\n\n".join(paragraphs[start:start + per_page])
+        if page.insert_textbox(fitz.Rect(54, 54, 541, 788), text, fontsize=9) < 0:
+            raise ValueError("Synthetic PDF page overflows; raise --pdf-pages or lower --clauses.")
+    pdf_bytes = document.tobytes()
+    document.close()
+    return pdf_bytes
+
+
+def build_corpus(size, formats, clauses, pdf_pages=8, seed=26):
+    """Returns a list of (filename, bytes, mime_type) synthetic agreements, all distinct."""
+    rng = random.Random(seed)
+    corpus = []
+    for i in range(size):
+        fmt = formats[i % len(formats)]
+        paragraphs = build_agreement_paragraphs(rng, clauses, i)
+        text = "\n\n".join(paragraphs)
+        if fmt == "pdf":
+            corpus.append((f"agreement_{i}.pdf", build_pdf(paragraphs, pdf_pages), "application/pdf"))
+        elif fmt == "docx":
+            import docx
+            document = docx.Document()
+            for paragraph in paragraphs:
+                document.add_paragraph(paragraph)
+            output = io.BytesIO()
+            document.save(output)
+            corpus.append((f"agreement_{i}.docx", output.getvalue(),
+                           "application/vnd.openxmlformats-officedocument.wordprocessingml.document"))
+        else:
+            corpus.append((f"agreement_{i}.txt", text.encode("utf-8"), "text/plain"))
+    return corpus
+
+
+# --- Session Simulation ---
+def _rss_mb():
+    """Current resident set size in MB (Linux /proc), falling back to peak RSS."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2**20
+    except (OSError, ValueError):
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def _click(at, label_fragment):
+    buttons = [b for b in at.button if label_fragment in b.label]
+    if not buttons:
+        raise RuntimeError(f"Button containing '{label_fragment}' not found.")
+    buttons[0].click()
+
+
+def _check(at, step):
+    if at.exception:
+        raise RuntimeError(f"{step}: {at.exception[0].value}")
+    if at.error:
+        raise RuntimeError(f"{step}: {at.error[0].value}")
+
+
+def run_session(document):
+    """
+    Drives one session through the app. Returns (AppTest, {step: seconds}, error or None).
+    The AppTest is returned so its session state stays alive for memory measurement.
+    """
+    at = AppTest.from_file(APP_PATH, default_timeout=SCRIPT_TIMEOUT)
+    timings = {}
+    actions = [
+        ("initialize", lambda: None),
+        ("upload", lambda: at.file_uploader[0].set_value(document)),
+        ("index", lambda: _click(at, "Process Document")),
+        ("extract", lambda: _click(at, "Extract Key Information")),
+    ]
+    try:
+        for step, action in actions:
+            action()
+            start = time.perf_counter()
+            at.run()
+            timings[step] = time.perf_counter() - start
+            _check(at, step)
+        if not at.session_state["extracted_metadata"]:
+            raise RuntimeError("extract: no metadata in session state")
+        return at, timings, None
+    except Exception as e:
+        return at, timings, f"{type(e).__name__}: {e}"
+
+
+def _percentiles(values):
+    if not values:
+        return "n/a"
+    ordered = sorted(values)
+    pick = lambda q: ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+    return f"p50 {statistics.median(ordered):7.3f}  p95 {pick(0.95):7.3f}  max {ordered[-1]:7.3f}"
+
+
+def run_level(concurrency, documents):
+    """Runs one session per document on `concurrency` threads."""
+    gc.collect()
+    rss_before = _rss_mb()
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        outcomes = list(pool.map(run_session, documents))
+    wall = time.perf_counter() - start
+    rss_after = _rss_mb() # Sessions still referenced, like open browser tabs
+
+    errors = [error for _, _, error in outcomes if error]
+    completed = len(outcomes) - len(errors)
+    result = {
+        "concurrency": concurrency,
+        "sessions": len(outcomes),
+        "errors": errors,
+        "wall": wall,
+        "throughput": completed / wall if wall else 0.0,
+        "rss_per_session": max(0.0, (rss_after - rss_before) / len(outcomes)), # See module docstring
+        "steps": {step: [t[step] for _, t, error in outcomes if not error and step in t] for step in STEPS},
+        "totals": [sum(t.values()) for _, t, error in outcomes if not error],
+        # (pages read, total pages) for multi-page uploads, to show progressive expansion
+        "pages": [(at.session_state["pages_processed"], at.session_state["total_pages"])
+                  for at, _, error in outcomes if not error and at.session_state["total_pages"] > 1],
+    }
+    del outcomes
+    gc.collect()
+    return result
+
+
+def find_saturation(results, min_gain):
+    """First concurrency level after which throughput grows by less than min_gain (fraction)."""
+    for current, following in zip(results, results[1:]):
+        if following["throughput"] < current["throughput"] * (1 + min_gain):
+            return current["concurrency"]
+    return None
+
+
+def print_report(results, min_gain):
+    for r in results:
+        print(f"\n=== concurrency {r['concurrency']}: {r['sessions']} sessions in {r['wall']:.2f}s, "
+              f"{r['throughput']:.2f} sessions/s, {len(r['errors'])} errors, "
+              f"RSS ~+{r['rss_per_session']:.1f} MB/session ===")
+        for step in STEPS:
+            print(f"  {step:<11} {_percentiles(r['steps'][step])}")
+        print(f"  {'total':<11} {_percentiles(r['totals'])}")
+        if r["pages"]:
+            read, total = map(sum, zip(*r["pages"]))
+            print(f"  {'pages':<11} {read} of {total} read over {len(r['pages'])} multi-page uploads")
+        for error in sorted(set(r["errors"]))[:3]:
+            print(f"  error: {error}")
+    saturation = find_saturation(results, min_gain)
+    print("\nSaturation point: " + (
+        f"{saturation} concurrent sessions (throughput gain < {min_gain:.0%} beyond this)" if saturation
+        else "not reached at the tested levels"))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--levels", type=int, nargs="+", default=[1, 2, 4, 8, 16], help="Concurrency levels to ramp through")
+    parser.add_argument("--sessions-per-worker", type=int, default=2)
+    parser.add_argument("--formats", nargs="+", choices=["txt", "docx", "pdf"], default=["txt", "docx", "pdf"])
+    parser.add_argument("--pdf-pages", type=int, default=8, help="Pages per synthetic PDF, stamp-paper cover included")
+    parser.add_argument("--clauses", type=int, default=60, help="Boilerplate clauses per synthetic agreement")
+    parser.add_argument("--llm-latency", type=float, default=0.2, help="Seconds per stand-in LLM call")
+    parser.add_argument("--embed-latency", type=float, default=0.05, help="Seconds per stand-in embedding call")
+    parser.add_argument("--rate-limit-sleep", type=float, default=0.0, help="Scale for the agent's 2s per-field sleep")
+    parser.add_argument("--saturation-gain", type=float, default=0.10)
+    parser.add_argument("--keep-store", action="store_true",
+                        help="Enable the similarity store (duplicate reuse), starting empty for each level")
+    args = parser.parse_args()
+
+    install_offline_models(args.llm_latency, args.embed_latency, args.rate_limit_sleep)
+    share_runtime_across_sessions()
+    if not args.keep_store:
+        disable_similarity_store()
+    # One distinct document per session: warm-up first, then each level's slice
+    level_sizes = [level * args.sessions_per_worker for level in args.levels]
+    corpus = build_corpus(1 + sum(level_sizes), args.formats, args.clauses, args.pdf_pages)
+    print(f"Synthetic corpus: {len(corpus)} distinct agreements ({', '.join(args.formats)}). "
+          f"Stand-in latency: LLM {args.llm_latency}s, embeddings {args.embed_latency}s. "
+          f"Similarity store: {'enabled, empty per level' if args.keep_store else 'disabled'}.")
+
+    work_dirs = []
+    try:
+        if args.keep_store:
+            work_dirs.append(fresh_similarity_store())
+        # Untimed warm-up so module imports and caches don't count against the first level
+        _, _, error = run_session(corpus[0])
+        if error:
+            print(f"Warm-up session failed: {error}")
+            return
+        results = []
+        offset = 1
+        for level, size in zip(args.levels, level_sizes):
+            if args.keep_store:
+                work_dirs.append(fresh_similarity_store())
+            print(f"Running concurrency {level}...", flush=True)
+            results.append(run_level(level, corpus[offset:offset + size]))
+            offset += size
+        print_report(results, args.saturation_gain)
+    finally:
+        os.chdir(APP_DIR)
+        for work_dir in work_dirs:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -2,6 +2,7 @@
 # pdf_utils.py
 
 import io
+import re
 import streamlit as st # Keep for potential caching later
 import os # For file extension checking
 
@@ -13,8 +14,8 @@ import fitz # PyMuPDF - Recommended for image rendering for OCR
 import pytesseract
 from PIL import Image # Pillow for image handling
 
-# --- Docx Library ---
-import docx
+# --- Docx (streamed straight from the zip, no python-docx object tree) ---
+import docx_utils
 
 try:
     # --- Windows Example ---
@@ -27,6 +28,15 @@ except Exception as config_ex:
     print(f"Warning: Could not set tesseract_cmd path - {config_ex}. Ensure Tesseract is installed and in PATH or path is set correctly.")
 
 
+# Markers appended per page by the PDF extractors, e.g. "--- Page 3 End ---", "--- Page 4 (No text via OCR) ---"
+PAGE_MARKER_RE = re.compile(r"---[^\n]*?Page \d+[^\n]*?---")
+
+
+def strip_page_markers(text):
+    """Removes the per-page markers added during PDF extraction, leaving only page content."""
+    return PAGE_MARKER_RE.sub("", text or "").strip()
+
+
 # @st.cache_data # Consider adding caching back later
 def _extract_text_image(image_file_object):
     """Extracts text from an uploaded image file object using OCR."""
@@ -51,13 +61,48 @@ def _extract_text_image(image_file_object):
         print(f"Error extracting text from image: {e}")
         return None
     
-def extract_text_from_file(uploaded_file):
+def get_page_count(uploaded_file):
+    """
+    Returns the number of pages in an uploaded file.
+    Only PDFs are paged; every other supported format counts as a single page.
+
+    Args:
+        uploaded_file: An uploaded file object from Streamlit.
+
+    Returns:
+        int: The page count, or 0 if the file is missing or unreadable.
+    """
+    if uploaded_file is None:
+        return 0
+    file_extension = os.path.splitext(uploaded_file.name)[1].lower()
+    if file_extension != ".pdf":
+        return 1
+    try:
+        uploaded_file.seek(0) # Reset pointer
+        pdf_document = fitz.open(stream=uploaded_file.read(), filetype="pdf")
+        page_count = pdf_document.page_count
+        pdf_document.close()
+        return page_count
+    except Exception as e:
+        print(f"Error reading PDF page count (PyMuPDF): {e}. Trying PyPDF2.")
+    try:
+        uploaded_file.seek(0)
+        return len(PyPDF2.PdfReader(uploaded_file).pages)
+    except Exception as e:
+        print(f"Error reading PDF page count (PyPDF2): {e}")
+        return 0
+
+
+def extract_text_from_file(uploaded_file, start_page=0, max_pages=None):
     """
     Extracts text content from uploaded PDF, DOCX, Image files, or TXT.
     Uses OCR fallback for PDFs and directly for images.
 
     Args:
         uploaded_file: An uploaded file object from Streamlit.
+        start_page (int): 0-based index of the first PDF page to extract.
+        max_pages (int): Maximum number of PDF pages to extract, or None for all remaining pages.
+            Non-PDF files are a single page, so any start_page > 0 returns None for them.
 
     Returns:
         str: The extracted text content, or None if extraction fails or format unsupported.
@@ -77,7 +122,12 @@ def extract_text_from_file(uploaded_file):
         uploaded_file.seek(0)
 
         if file_extension == ".pdf":
-            return _extract_text_pdf_with_ocr_fallback(uploaded_file)
+            pdf_text = _extract_text_pdf_with_ocr_fallback(uploaded_file, start_page, max_pages)
+            # Pages that only produced "No text"/"Error" markers have nothing worth indexing
+            return pdf_text if strip_page_markers(pdf_text) else None
+        elif start_page > 0:
+            # Non-PDF files are a single "page" which was already extracted
+            return None
         elif file_extension == ".docx":
             return _extract_text_docx(uploaded_file)
         elif file_extension == ".txt":
@@ -99,8 +149,45 @@ def extract_text_from_file(uploaded_file):
         return None
 
 
-def _extract_text_pdf_with_ocr_fallback(pdf_file_object):
-    """Extract text from PDF using PyPDF2, with PyMuPDF+Tesseract OCR fallback."""
+def extract_leading_text(uploaded_file, total_pages, initial_pages, page_batch):
+    """
+    Extracts the first pages of a file for progressive mode. If they yield no text
+    (blank, cover or stamp-paper pages OCR can't read), keeps reading further
+    batches until some text appears or the pages run out.
+
+    Args:
+        uploaded_file: An uploaded file object from Streamlit.
+        total_pages (int): Page count from get_page_count (0 if it could not be read).
+        initial_pages (int): Pages to extract first.
+        page_batch (int): Pages to extract per further step.
+
+    Returns:
+        tuple: (str or None, int) the extracted text and the number of leading pages read.
+    """
+    if total_pages <= 0: # Page count unknown, extract everything like non-progressive mode
+        return extract_text_from_file(uploaded_file), total_pages
+    pages_read = 0
+    batch = initial_pages
+    while pages_read < total_pages:
+        text = extract_text_from_file(uploaded_file, start_page=pages_read, max_pages=batch)
+        pages_read = min(total_pages, pages_read + batch)
+        if text:
+            return text, pages_read
+        print(f"No text in the first {pages_read} of {total_pages} pages. Reading further...")
+        batch = page_batch
+    return None, pages_read
+
+
+def _page_range(page_count, start_page, max_pages):
+    """Returns the range of 0-based page indices to process, clamped to the document."""
+    start_page = max(0, start_page)
+    end_page = page_count if max_pages is None else min(page_count, start_page + max_pages)
+    return range(start_page, end_page)
+
+
+def _extract_text_pdf_with_ocr_fallback(pdf_file_object, start_page=0, max_pages=None):
+    """Extract text from PDF using PyPDF2, with PyMuPDF+Tesseract OCR fallback.
+    Only pages in [start_page, start_page + max_pages) are extracted and OCRed."""
     extracted_text_pypdf2 = ""
     ocr_needed = False
     page_count_pypdf2 = 0
@@ -110,12 +197,14 @@ def _extract_text_pdf_with_ocr_fallback(pdf_file_object):
     try:
         pdf_file_object.seek(0) # Reset pointer
         reader = PyPDF2.PdfReader(pdf_file_object)
-        page_count_pypdf2 = len(reader.pages)
-        print(f"(PyPDF2) PDF has {page_count_pypdf2} pages.")
+        pages_to_read = _page_range(len(reader.pages), start_page, max_pages)
+        page_count_pypdf2 = len(pages_to_read)
+        print(f"(PyPDF2) PDF has {len(reader.pages)} pages, reading {page_count_pypdf2}.")
 
-        for i, page in enumerate(reader.pages):
+        for i in pages_to_read:
             page_num = i + 1
             try:
+                page = reader.pages[i]
                 page_text = page.extract_text()
                 if page_text and page_text.strip():
                     extracted_text_pypdf2 += page_text + f"\n\n--- Page {page_num} End ---\n\n"
@@ -150,10 +239,10 @@ def _extract_text_pdf_with_ocr_fallback(pdf_file_object):
             pdf_file_object.seek(0) # Reset pointer
             pdf_bytes = pdf_file_object.read() # Read bytes for fitz
             pdf_document = fitz.open(stream=pdf_bytes, filetype="pdf")
-            page_count_ocr = pdf_document.page_count
-            print(f"(OCR) Processing {page_count_ocr} pages.")
+            pages_to_ocr = _page_range(pdf_document.page_count, start_page, max_pages)
+            print(f"(OCR) Processing {len(pages_to_ocr)} pages.")
 
-            for page_num_idx in range(page_count_ocr):
+            for page_num_idx in pages_to_ocr:
                 page_num = page_num_idx + 1
                 try:
                     page = pdf_document.load_page(page_num_idx)
@@ -202,14 +291,13 @@ def _extract_text_pdf_with_ocr_fallback(pdf_file_object):
 
 
 def _extract_text_docx(docx_file_object):
-    """Extracts text content from an uploaded DOCX file object."""
+    """Extracts text content (paragraphs, tables, headers, footers, text boxes) from an uploaded DOCX file object."""
     try:
         docx_file_object.seek(0) # Reset pointer
-        document = docx.Document(docx_file_object)
-        full_text = [para.text for para in document.paragraphs if para.text] # Ensure paragraph has text
-        print(f"Successfully extracted text from DOCX.")
-        result = '\n\n'.join(full_text).strip()
-        return result if result else None # Return None if document was empty
+        result = docx_utils.extract_docx_text(docx_file_object)
+        if result:
+            print(f"Successfully extracted text from DOCX. Length: {len(result)}")
+        return result # None if document was empty or invalid
     except Exception as e:
         print(f"Error extracting text from DOCX: {e}")
         return None
\ No newline at end of file
@@ -0,0 +1,287 @@
+# results.py
+
+import argparse
+import csv
+import os
+from enum import Enum
+
+import pandas as pd
+
+# --- Sentinel values the agent writes into metadata ---
+NOT_FOUND_VALUE = "Not Found"
+EXTRACTION_ERROR_VALUE = "Extraction Error"
+RATE_LIMIT_ERROR_VALUE = "Rate Limit Error"
+
+RESULT_COLUMNS = ["File", "Field", "Value", "Status"]
+LARGE_EXPORT_ROWS = 50_000 # Above this, Excel export switches to xlsxwriter constant-memory mode
+EXPORT_CHUNK_ROWS = 10_000 # Rows buffered per write when streaming CSV/Parquet
+EXCEL_MAX_ROWS = 1_048_576 # Rows per Excel sheet, header included
+
+
+class FieldStatus(str, Enum):
+    """Outcome of extracting a single metadata field."""
+    FOUND = "found"
+    NOT_FOUND = "not_found"
+    ERROR = "error"
+    RATE_LIMITED = "rate_limited"
+
+    @property
+    def is_error(self):
+        return self in (FieldStatus.ERROR, FieldStatus.RATE_LIMITED)
+
+
+STATUS_ICONS = {
+    FieldStatus.FOUND: "✅",
+    FieldStatus.NOT_FOUND: "❓",
+    FieldStatus.ERROR: "❌",
+    FieldStatus.RATE_LIMITED: "❌",
+}
+
+# Exact sentinel -> status; anything else non-empty is FOUND
+_SENTINEL_STATUS = {
+    NOT_FOUND_VALUE: FieldStatus.NOT_FOUND,
+    EXTRACTION_ERROR_VALUE: FieldStatus.ERROR,
+    RATE_LIMIT_ERROR_VALUE: FieldStatus.RATE_LIMITED,
+}
+
+_STATUS_DTYPE = pd.CategoricalDtype([s.value for s in FieldStatus])
+
+
+def compute_status(values):
+    """
+    Vectorized status for a Series of extracted values, used when the agent's
+    statuses are not available (e.g. results loaded from the similarity store).
+
+    Args:
+        values (pd.Series): Extracted values.
+
+    Returns:
+        pd.Series: Categorical series of FieldStatus values.
+    """
+    stripped = values.astype("string").str.strip()
+    status = stripped.map({k: v.value for k, v in _SENTINEL_STATUS.items()})
+    status = status.where(stripped.fillna("") != "", FieldStatus.NOT_FOUND.value) # None / blank
+    return status.fillna(FieldStatus.FOUND.value).astype(_STATUS_DTYPE)
+
+
+def results_frame(documents):
+    """
+    Builds the long-format results table (File, Field, Value, Status) for many documents.
+    Statuses from the agent are used where given; the rest are computed in one vectorized pass.
+
+    Args:
+        documents: Iterable of (filename, metadata dict, statuses dict or None).
+
+    Returns:
+        pd.DataFrame: One row per (document, field).
+    """
+    files, fields, values, agent_statuses = [], [], [], []
+    for filename, metadata, statuses in documents:
+        statuses = statuses or {}
+        for field, value in metadata.items():
+            files.append(filename)
+            fields.append(field)
+            values.append(value)
+            status = statuses.get(field)
+            agent_statuses.append(FieldStatus(status).value if status is not None else None)
+
+    df = pd.DataFrame({
+        "File": pd.Series(files, dtype="string"),
+        "Field": pd.Series(fields, dtype="string"),
+        "Value": pd.Series(values, dtype="object"),
+    })
+    df["Status"] = pd.Series(agent_statuses, dtype=_STATUS_DTYPE)
+    missing = df["Status"].isna()
+    if missing.any():
+        df.loc[missing, "Status"] = compute_status(df.loc[missing, "Value"])
+    # Standardize blanks so exports never contain empty cells for missing fields
+    df["Value"] = df["Value"].where(df["Status"] != FieldStatus.NOT_FOUND.value, NOT_FOUND_VALUE)
+    return df[RESULT_COLUMNS]
+
+
+def metadata_to_frame(metadata, statuses=None, filename=""):
+    """Results table for a single document. See results_frame."""
+    return results_frame([(filename, metadata, statuses)])
+
+
+def iter_results_frames(documents, chunk_documents=EXPORT_CHUNK_ROWS // 10):
+    """Lazily yields results_frame tables for chunks of documents, for streaming exports."""
+    chunk = []
+    for document in documents:
+        chunk.append(document)
+        if len(chunk) >= chunk_documents:
+            yield results_frame(chunk)
+            chunk = []
+    if chunk:
+        yield results_frame(chunk)
+
+
+def status_icons(status):
+    """Maps a categorical status Series to display icons."""
+    return status.map({s.value: icon for s, icon in STATUS_ICONS.items()}).astype("string")
+
+
+def _iter_row_chunks(frames, chunk_rows):
+    """Re-chunks an iterable of result DataFrames into DataFrames of about chunk_rows rows."""
+    buffer, buffered_rows = [], 0
+    for df in frames:
+        buffer.append(df)
+        buffered_rows += len(df)
+        if buffered_rows >= chunk_rows:
+            yield pd.concat(buffer, ignore_index=True)
+            buffer, buffered_rows = [], 0
+    if buffer:
+        yield pd.concat(buffer, ignore_index=True)
+
+
+def export_csv(frames, output, chunk_rows=EXPORT_CHUNK_ROWS):
+    """
+    Streams result DataFrames to CSV without materializing the whole batch.
+
+    Args:
+        frames: Iterable of DataFrames with RESULT_COLUMNS (e.g. from iter_results_frames).
+        output: Path or text file object.
+
+    Returns:
+        int: Number of rows written.
+    """
+    rows_written = 0
+    close_after = isinstance(output, str)
+    handle = open(output, "w", newline="", encoding="utf-8") if close_after else output
+    try:
+        writer = csv.writer(handle)
+        writer.writerow(RESULT_COLUMNS)
+        for chunk in _iter_row_chunks(frames, chunk_rows):
+            chunk[RESULT_COLUMNS].to_csv(handle, header=False, index=False)
+            rows_written += len(chunk)
+    finally:
+        if close_after:
+            handle.close()
+    print(f"Exported {rows_written} result rows to CSV.")
+    return rows_written
+
+
+def export_parquet(frames, output, chunk_rows=EXPORT_CHUNK_ROWS):
+    """
+    Streams result DataFrames to Parquet, one row group per chunk. Requires pyarrow.
+
+    Args:
+        frames: Iterable of DataFrames with RESULT_COLUMNS.
+        output: Path or binary file object.
+
+    Returns:
+        int: Number of rows written.
+    """
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise ImportError("Parquet export requires 'pyarrow'. Install it with: pip install pyarrow")
+
+    schema = pa.schema([
+        ("File", pa.string()),
+        ("Field", pa.string()),
+        ("Value", pa.string()),
+        ("Status", pa.dictionary(pa.int8(), pa.string())),
+    ])
+    rows_written = 0
+    with pq.ParquetWriter(output, schema) as writer:
+        for chunk in _iter_row_chunks(frames, chunk_rows):
+            chunk = chunk[RESULT_COLUMNS].astype({"File": "string", "Field": "string", "Value": "string"})
+            writer.write_table(pa.Table.from_pandas(chunk, schema=schema, preserve_index=False))
+            rows_written += len(chunk)
+    print(f"Exported {rows_written} result rows to Parquet.")
+    return rows_written
+
+
+def export_excel(frames, output, constant_memory=False, sheet_name="Metadata"):
+    """
+    Writes result DataFrames to an Excel workbook row by row with xlsxwriter.
+    With constant_memory, xlsxwriter flushes each row to disk so memory stays flat
+    (rows must be written in order, which this function guarantees).
+    A sheet holds at most EXCEL_MAX_ROWS rows; further rows continue on new
+    sheets ("Metadata (2)", ...), each with its own header row.
+
+    Args:
+        frames: Iterable of DataFrames with RESULT_COLUMNS, or columns subset thereof.
+        output: Path or binary file object.
+
+    Returns:
+        int: Number of rows written.
+    """
+    import xlsxwriter
+
+    workbook = xlsxwriter.Workbook(output, {"constant_memory": constant_memory})
+    header_format = workbook.add_format({"bold": True})
+    worksheet = None
+    sheet_count = 0
+    sheet_row = EXCEL_MAX_ROWS # Forces a sheet to be added for the first row
+    rows_written = 0
+    columns = None
+    try:
+        for df in frames:
+            if columns is None:
+                columns = list(df.columns)
+            for row in df[columns].astype("object").where(df[columns].notna(), "").itertuples(index=False):
+                if sheet_row >= EXCEL_MAX_ROWS:
+                    sheet_count += 1
+                    worksheet = workbook.add_worksheet(sheet_name if sheet_count == 1 else f"{sheet_name} ({sheet_count})")
+                    worksheet.write_row(0, 0, columns, header_format)
+                    sheet_row = 1
+                # xlsxwriter returns -1 instead of raising when a row can't be written
+                if worksheet.write_row(sheet_row, 0, [str(v) for v in row]) == -1:
+                    raise ValueError(f"Excel could not store result row {rows_written + 1}. Export to CSV or Parquet instead.")
+                sheet_row += 1
+                rows_written += 1
+        if worksheet is None: # No results: still produce a sheet with the header
+            worksheet = workbook.add_worksheet(sheet_name)
+            worksheet.write_row(0, 0, columns or RESULT_COLUMNS, header_format)
+    finally:
+        workbook.close()
+    print(f"Exported {rows_written} result rows to Excel in {max(sheet_count, 1)} sheet(s) (constant_memory={constant_memory}).")
+    return rows_written
+
+
+EXPORT_FORMATS = ("csv", "parquet", "xlsx")
+
+
+def export_results(documents, output, fmt):
+    """
+    Streams results for many documents to CSV, Parquet or Excel without building one big table.
+
+    Args:
+        documents: Iterable of (filename, metadata dict, statuses dict or None).
+        output: Path or file object.
+        fmt (str): One of EXPORT_FORMATS.
+
+    Returns:
+        int: Number of rows written.
+    """
+    frames = iter_results_frames(documents)
+    if fmt == "csv":
+        return export_csv(frames, output)
+    if fmt == "parquet":
+        return export_parquet(frames, output)
+    if fmt == "xlsx":
+        return export_excel(frames, output, constant_memory=True) # Batch size unknown up front
+    raise ValueError(f"Unsupported export format '{fmt}'. Choose one of {EXPORT_FORMATS}.")
+
+
+def main():
+    """Exports every result kept in the similarity store (see similarity_index.py)."""
+    from similarity_index import DocumentSimilarityIndex
+
+    parser = argparse.ArgumentParser(description="Export stored extraction results for all processed agreements.")
+    parser.add_argument("output", help="Output file; the format is taken from its extension unless --format is given")
+    parser.add_argument("--format", choices=EXPORT_FORMATS)
+    parser.add_argument("--store", default=".similarity_store", help="Similarity store directory")
+    args = parser.parse_args()
+
+    fmt = args.format or os.path.splitext(args.output)[1].lstrip(".").lower()
+    store = DocumentSimilarityIndex(args.store)
+    print(f"Exporting {len(store.entries)} stored documents to '{args.output}' ({fmt})...")
+    export_results(store.iter_stored_results(), args.output, fmt)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,248 @@
+# similarity_index.py
+
+import os
+import json
+import hashlib
+import random
+import shutil
+import tempfile
+import threading
+import uuid
+
+import pdf_utils
+
+# --- MinHash Settings ---
+NUM_PERMUTATIONS = 128 # Signature length; higher = more accurate Jaccard estimate
+SHINGLE_SIZE = 5 # Words per shingle
+NEAR_DUPLICATE_THRESHOLD = 0.8 # Estimated Jaccard similarity to treat as same template
+PREFIX_WORDS = 300 # Leading words (about one page) compared when either side covers only its first pages
+_MERSENNE_PRIME = (1 << 61) - 1
+_MAX_HASH = (1 << 32) - 1
+
+# Fixed seed so signatures stay comparable across runs
+_rng = random.Random(1566)
+_PERMUTATIONS = [(_rng.randint(1, _MERSENNE_PRIME - 1), _rng.randint(0, _MERSENNE_PRIME - 1))
+                 for _ in range(NUM_PERMUTATIONS)]
+
+
+def _normalize(text):
+    """Drops page markers (they differ between PyPDF2 and OCR runs), lowercases and collapses whitespace."""
+    return " ".join(pdf_utils.strip_page_markers(text).lower().split())
+
+
+def _shingles(normalized_text):
+    """Returns the set of word shingles of the normalized text."""
+    words = normalized_text.split(" ")
+    if len(words) <= SHINGLE_SIZE:
+        return {normalized_text}
+    return {" ".join(words[i:i + SHINGLE_SIZE]) for i in range(len(words) - SHINGLE_SIZE + 1)}
+
+
+def minhash_signature(text, max_words=None):
+    """
+    Computes the MinHash signature (list of ints) of the text's word shingles.
+    With max_words, only the first max_words normalized words are used.
+    """
+    normalized = _normalize(text)
+    if max_words is not None:
+        normalized = " ".join(normalized.split(" ")[:max_words])
+    shingle_hashes = [int.from_bytes(hashlib.blake2b(s.encode("utf-8"), digest_size=8).digest(), "big")
+                      for s in _shingles(normalized)]
+    return [min(((a * h + b) % _MERSENNE_PRIME) & _MAX_HASH for h in shingle_hashes)
+            for a, b in _PERMUTATIONS]
+
+
+def estimate_similarity(signature_a, signature_b):
+    """Estimates Jaccard similarity from two MinHash signatures."""
+    matches = sum(1 for x, y in zip(signature_a, signature_b) if x == y)
+    return matches / len(signature_a) if signature_a else 0.0
+
+
+def text_fingerprint(text):
+    """SHA-256 of the normalized text, used to detect exact duplicates."""
+    return hashlib.sha256(_normalize(text).encode("utf-8")).hexdigest()
+
+
+def file_fingerprint(file_bytes):
+    """SHA-256 of the raw uploaded bytes; identical files are exact duplicates without any extraction."""
+    return hashlib.sha256(file_bytes).hexdigest()
+
+
+class DocumentSimilarityIndex:
+    """
+    Local store of previously processed documents, keyed by text signatures.
+    Each entry keeps the saved FAISS index and extracted metadata so exact
+    duplicates can skip indexing/extraction and near-duplicates (same template)
+    can reuse chunk embeddings and unchanged answers.
+
+    A text fingerprint only proves an exact duplicate when it covers the whole
+    document on both sides (`complete`); progressive runs index only leading
+    pages, so for those only identical file bytes count as exact. Likewise, near
+    duplicates are compared on the leading PREFIX_WORDS words whenever either side
+    is incomplete, since a few pages against a whole document never reach the threshold.
+    One instance is shared by all sessions; writes are serialized with a lock.
+
+    Layout:
+        <store_dir>/signatures.json    list of {doc_id, filename, file_hash, fingerprint, complete,
+                                       minhash, prefix_minhash}
+        <store_dir>/<doc_id>/          FAISS index saved via save_local
+        <store_dir>/<doc_id>/metadata.json
+        <store_dir>/<doc_id>/sources.json   chunk texts each field was answered from
+    """
+
+    def __init__(self, store_dir=".similarity_store", threshold=NEAR_DUPLICATE_THRESHOLD):
+        self.store_dir = store_dir
+        self.threshold = threshold
+        self._signatures_path = os.path.join(store_dir, "signatures.json")
+        self._lock = threading.Lock()
+        self.entries = self._load_entries()
+
+    def _load_entries(self):
+        if not os.path.exists(self._signatures_path):
+            return []
+        try:
+            with open(self._signatures_path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except Exception as e:
+            print(f"Warning: Could not read similarity store ({e}). Starting empty.")
+            return []
+
+    def _save_entries(self):
+        """Writes signatures.json atomically. Caller must hold self._lock."""
+        os.makedirs(self.store_dir, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=self.store_dir, prefix="signatures.", suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump(self.entries, f)
+            os.replace(tmp_path, self._signatures_path) # Atomic so a crash never truncates the store
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    def _find_exact(self, entries, file_hash, fingerprint, complete):
+        for entry in entries:
+            if file_hash and entry.get("file_hash") == file_hash:
+                return entry
+            if complete and entry.get("complete", False) and entry["fingerprint"] == fingerprint:
+                return entry
+        return None
+
+    def index_path(self, doc_id):
+        """Directory holding the saved FAISS index of a stored document."""
+        return os.path.join(self.store_dir, doc_id)
+
+    def find(self, text, file_hash=None, complete=True):
+        """
+        Checks the text against stored documents.
+
+        Args:
+            text (str): Extracted text of the upload.
+            file_hash (str): file_fingerprint of the uploaded bytes, if available.
+            complete (bool): Whether text covers the whole document (False for progressive runs).
+
+        Returns:
+            tuple: ("exact" | "near" | None, doc_id or None, similarity float)
+        """
+        if not text:
+            return None, None, 0.0
+        with self._lock:
+            entries = list(self.entries)
+        exact = self._find_exact(entries, file_hash, text_fingerprint(text), complete)
+        if exact:
+            print(f"Exact duplicate of stored document '{exact['filename']}'.")
+            return "exact", exact["doc_id"], 1.0
+
+        signature = minhash_signature(text) if complete else None
+        prefix_signature = None
+        best_id, best_similarity = None, 0.0
+        for entry in entries:
+            if complete and entry.get("complete", False):
+                similarity = estimate_similarity(signature, entry["minhash"])
+            else: # Compare like with like: leading words on both sides
+                if prefix_signature is None:
+                    prefix_signature = minhash_signature(text, max_words=PREFIX_WORDS)
+                similarity = estimate_similarity(prefix_signature, entry.get("prefix_minhash", entry["minhash"]))
+            if similarity > best_similarity:
+                best_id, best_similarity = entry["doc_id"], similarity
+        if best_id and best_similarity >= self.threshold:
+            print(f"Near duplicate of stored document {best_id} (similarity {best_similarity:.2f}).")
+            return "near", best_id, best_similarity
+        return None, None, best_similarity
+
+    def _load_json(self, doc_id, name):
+        try:
+            with open(os.path.join(self.index_path(doc_id), name), "r", encoding="utf-8") as f:
+                return json.load(f)
+        except Exception as e:
+            print(f"Error loading stored {name} for {doc_id}: {e}")
+            return None
+
+    def load_metadata(self, doc_id):
+        """Returns the stored metadata dict for a document, or None."""
+        return self._load_json(doc_id, "metadata.json")
+
+    def load_sources(self, doc_id):
+        """Returns {field: [chunk texts]} the stored answers came from, or None."""
+        return self._load_json(doc_id, "sources.json")
+
+    def add(self, text, filename, metadata, save_index, sources=None, file_hash=None, complete=True):
+        """
+        Stores a processed document, unless an exact duplicate is already stored.
+
+        Args:
+            text (str): The full indexed text the signatures are computed from.
+            filename (str): Original filename, for logging only.
+            metadata (dict): Extracted metadata to reuse for exact duplicates.
+            save_index: Callable (path) -> None that writes the FAISS index to path.
+            sources (dict): Field name -> chunk texts each answer came from.
+            file_hash (str): file_fingerprint of the uploaded bytes.
+            complete (bool): Whether text covers the whole document.
+
+        Returns:
+            str: The doc_id (existing one for duplicates), or None if storing failed.
+        """
+        # Signatures are CPU-bound; compute them before taking the lock shared by all sessions
+        fingerprint = text_fingerprint(text)
+        signature = minhash_signature(text)
+        prefix_signature = minhash_signature(text, max_words=PREFIX_WORDS)
+        with self._lock:
+            existing = self._find_exact(self.entries, file_hash, fingerprint, complete)
+            if existing:
+                print(f"Document '{filename}' already stored as {existing['doc_id']}. Skipping.")
+                return existing["doc_id"]
+            doc_id = uuid.uuid4().hex
+            path = self.index_path(doc_id)
+            try:
+                os.makedirs(path, exist_ok=True)
+                save_index(path)
+                with open(os.path.join(path, "metadata.json"), "w", encoding="utf-8") as f:
+                    json.dump(metadata, f)
+                with open(os.path.join(path, "sources.json"), "w", encoding="utf-8") as f:
+                    json.dump(sources or {}, f)
+                self.entries.append({
+                    "doc_id": doc_id,
+                    "filename": filename,
+                    "file_hash": file_hash,
+                    "fingerprint": fingerprint,
+                    "complete": complete,
+                    "minhash": signature,
+                    "prefix_minhash": prefix_signature,
+                })
+                self._save_entries()
+            except Exception as e:
+                print(f"Error storing document in similarity index: {e}")
+                self.entries = [entry for entry in self.entries if entry["doc_id"] != doc_id]
+                shutil.rmtree(path, ignore_errors=True) # Don't leave an orphan index directory
+                return None
+        print(f"Stored document '{filename}' as {doc_id} in similarity index.")
+        return doc_id
+
+    def iter_stored_results(self):
+        """Yields (filename, metadata, None) for every stored document, loading one at a time."""
+        with self._lock:
+            entries = list(self.entries)
+        for entry in entries:
+            metadata = self.load_metadata(entry["doc_id"])
+            if metadata:
+                yield entry["filename"], metadata, None
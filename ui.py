@@ -3,6 +3,7 @@ import streamlit as st
 import pandas as pd
 import io # Keep for BytesIO
 import base64
+import results
 
 # --- Existing Functions ---
 def display_header():
@@ -49,42 +50,33 @@ def display_extract_button(disabled=False):
 # --- Keep Excel conversion helper ---
 @st.cache_data
 def convert_df_to_excel(df):
+    # Large batches are written row by row in xlsxwriter constant-memory mode
     output = io.BytesIO()
-    with pd.ExcelWriter(output, engine='xlsxwriter') as writer:
-        df.to_excel(writer, index=False, sheet_name='Metadata')
+    results.export_excel([df], output, constant_memory=len(df) > results.LARGE_EXPORT_ROWS)
     processed_data = output.getvalue()
     return processed_data
 
+@st.cache_data
+def convert_df_to_csv(df):
+    output = io.StringIO()
+    results.export_csv([df], output)
+    return output.getvalue().encode('utf-8')
+
 # --- Modified Table Display (Takes single dict) ---
-def display_metadata_table(metadata_dict, filename=""): # Accept filename optionally
-    """Displays extracted metadata for a single file in a table with download."""
+def display_metadata_table(metadata_dict, filename="", statuses=None): # Accept filename optionally
+    """Displays extracted metadata for a single file in a table with download.
+    statuses: FieldStatus per field from the agent; computed from the values when None."""
     st.subheader("3. Extracted Information")
     st.caption(f"Results for: **{filename}**") if filename else None # Display filename
 
     if metadata_dict:
-        # Prepare data for display and potential DataFrame creation
-        display_data = []
-        error_found = False
-        for field, value in metadata_dict.items():
-            status = "✅"
-            if value is None or str(value).strip() == "":
-                value = "Not Found"
-                status = "❓"
-            # Check for specific error strings set by the agent
-            elif isinstance(value, str) and ("not found" in value.lower() and len(value) < 20): # Allow longer "Not Found" explanations
-                 status = "❓"
-                 value = "Not Found" # Standardize
-            elif isinstance(value, str) and ("error" in value.lower() and len(value) < 50): # Basic error check
-                status = "❌"
-                error_found = True
-
-            display_data.append({"Field": field, "Value": value, "Status": status})
-
-        if not display_data:
+        results_df = results.metadata_to_frame(metadata_dict, statuses, filename)
+        if results_df.empty:
              st.warning("No metadata fields processed.")
              return
+        error_found = results_df["Status"].isin([results.FieldStatus.ERROR.value, results.FieldStatus.RATE_LIMITED.value]).any()
 
-        df = pd.DataFrame(display_data)
+        df = results_df[["Field", "Value"]].assign(Status=results.status_icons(results_df["Status"]))
 
         st.dataframe(
             df,
@@ -101,15 +93,20 @@ def display_metadata_table(metadata_dict, filename=""): # Accept filename option
         # Only offer download if no critical errors were found during extraction
         if not error_found or st.checkbox("Include rows with errors in download?"):
             st.markdown("---")
-            # Prepare DataFrame for export (maybe without status)
-            export_df = df[['Field', 'Value']].copy()
-            excel_bytes = convert_df_to_excel(export_df)
+            # Both downloads carry the same columns: File, Field, Value, Status
+            excel_bytes = convert_df_to_excel(results_df)
             st.download_button(
                 label="📥 Download Results as Excel",
                 data=excel_bytes,
                 file_name=f'metadata_{filename}.xlsx' if filename else 'rental_agreement_metadata.xlsx',
                 mime='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
             )
+            st.download_button(
+                label="📥 Download Results as CSV",
+                data=convert_df_to_csv(results_df),
+                file_name=f'metadata_{filename}.csv' if filename else 'rental_agreement_metadata.csv',
+                mime='text/csv'
+            )
         elif error_found:
              st.warning("Extraction errors detected. Download disabled unless checkbox is checked.")
 